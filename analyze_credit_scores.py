@@ -1,23 +1,43 @@
+import argparse
+
+import matplotlib
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from wallet_selection import select_extremes
+
 # Load the CSV file
 def load_data(file_path):
     """
     Load the top wallets CSV file.
     """
-    try:
-        data = pd.read_csv(file_path)
-        print("Data loaded successfully.")
-        print(data.head())
-        return data
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return None
+    # Explicit dtypes skip type inference; the pyarrow engine parses blocks in parallel
+    data = pd.read_csv(file_path, engine='pyarrow', dtype_backend='pyarrow',
+                       dtype={'account.id': 'string', 'score': 'float32'})
+
+    missing = {'account.id', 'score'} - set(data.columns)
+    if missing:
+        raise ValueError(f"{file_path} is missing required columns: {sorted(missing)}")
+
+    print("Data loaded successfully.")
+    print(data.head())
+    return data
+
+# Show the current figure, or save it to a PNG file for headless runs
+def finish_plot(name, interactive=False):
+    """
+    Show the current figure in interactive mode, otherwise save it as <name>.png.
+    """
+    if interactive:
+        plt.show()
+    else:
+        plt.savefig(f'{name}.png', dpi=100, bbox_inches='tight')
+    plt.close()
 
 # Plot the distribution of scores
-def plot_score_distribution(data):
+def plot_score_distribution(data, interactive=False):
     """
     Plot the distribution of credit scores.
     """
@@ -27,10 +47,10 @@ def plot_score_distribution(data):
     plt.xlabel('Score', fontsize=14)
     plt.ylabel('Frequency', fontsize=14)
     plt.grid(axis='y')
-    plt.show()
+    finish_plot('score_distribution', interactive)
 
 # Identify outliers using a boxplot
-def identify_outliers(data):
+def identify_outliers(data, interactive=False):
     """
     Identify outliers in credit scores using a boxplot.
     """
@@ -39,7 +59,7 @@ def identify_outliers(data):
     plt.title('Boxplot of Credit Scores', fontsize=16)
     plt.xlabel('Score', fontsize=14)
     plt.grid(axis='x')
-    plt.show()
+    finish_plot('score_boxplot', interactive)
 
 # Analyze top and bottom wallets
 def analyze_wallets(data):
@@ -47,32 +67,56 @@ def analyze_wallets(data):
     Analyze the wallets with the highest and lowest scores.
     """
     print("\nTop 5 Wallets with Highest Scores:")
-    print(data.nlargest(5, 'score'))
+    print(select_extremes(data, 5))
 
     print("\nTop 5 Wallets with Lowest Scores:")
-    print(data.nsmallest(5, 'score'))
+    print(select_extremes(data, 5, largest=False))
 
 # Perform correlation analysis
-def analyze_correlations(processed_file, score_column='score'):
+def analyze_correlations(processed_file, score_column='score', interactive=False):
     """
     Analyze correlations between score and other features.
     """
     try:
         processed_data = pd.read_csv(processed_file)
-        correlations = processed_data.corr()
+
+        # Correlate only the numeric features, as one matrix operation when nothing is missing
+        numeric = processed_data.select_dtypes('number')
+        values = numeric.to_numpy(dtype=np.float64)
+        if np.isnan(values).any():
+            correlations = numeric.corr()  # Pairwise-complete correlations
+        else:
+            correlations = pd.DataFrame(
+                np.corrcoef(values, rowvar=False), index=numeric.columns, columns=numeric.columns
+            )
         print("\nCorrelations with Score:")
         print(correlations[score_column])
 
-        # Heatmap for correlation matrix
+        # Heatmap for correlation matrix; cell labels and grid lines only while they stay readable
+        n = correlations.shape[0]
         plt.figure(figsize=(12, 10))
-        sns.heatmap(correlations, annot=True, cmap='coolwarm', fmt=".2f", linewidths=0.5)
+        if n > 50:
+            plt.imshow(correlations.to_numpy(), cmap='coolwarm', vmin=-1, vmax=1)
+            plt.colorbar()
+        else:
+            sns.heatmap(correlations, annot=n <= 15, cmap='coolwarm', fmt=".2f",
+                        linewidths=0 if n > 30 else 0.5)
         plt.title('Correlation Matrix', fontsize=16)
-        plt.show()
+        finish_plot('correlation_matrix', interactive)
     except Exception as e:
         print(f"Error analyzing correlations: {e}")
 
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Analyze wallet credit scores.')
+    parser.add_argument('--interactive', action='store_true',
+                        help='show plots in a window instead of saving them as PNG files')
+    args = parser.parse_args()
+
+    # Render plots off-screen unless a window was requested
+    if not args.interactive:
+        matplotlib.use('Agg')
+
     # Path to the top_wallets.csv file
     top_wallets_file = r'C:\Users\Manobhiram\Desktop\New proj scoring,py\top_wallets.csv'
 
@@ -82,15 +126,14 @@ if __name__ == "__main__":
     # Load the data
     data = load_data(top_wallets_file)
 
-    if data is not None:
-        # Plot the distribution of scores
-        plot_score_distribution(data)
+    # Plot the distribution of scores
+    plot_score_distribution(data, interactive=args.interactive)
 
-        # Identify outliers
-        identify_outliers(data)
+    # Identify outliers
+    identify_outliers(data, interactive=args.interactive)
 
-        # Analyze top and bottom wallets
-        analyze_wallets(data)
+    # Analyze top and bottom wallets
+    analyze_wallets(data)
 
-        # Perform correlation analysis (if processed_data.csv is available)
-        analyze_correlations(processed_data_file)
\ No newline at end of file
+    # Perform correlation analysis (if processed_data.csv is available)
+    analyze_correlations(processed_data_file, interactive=args.interactive)
\ No newline at end of file
@@ -1,5 +1,174 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numba
+import numpy as np
+import orjson
 import pandas as pd
-import json
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from wallet_selection import select_extremes
+
+
+# Top-level JSON keys holding transaction arrays, and the transaction type assigned to their rows
+TRANSACTION_TYPES = [
+    ('deposits', 'deposit'),
+    ('borrows', 'borrow'),
+    ('repayments', 'repay'),
+    ('withdrawals', 'withdraw'),
+    ('liquidations', 'liquidation')
+]
+
+# Explicit schema for a transaction record (numeric fields are encoded as JSON strings)
+TRANSACTION_SCHEMA = pa.schema([
+    ('account', pa.struct([('id', pa.string())])),
+    ('amount', pa.string()),
+    ('amountUSD', pa.string()),
+    ('asset', pa.struct([('id', pa.string()), ('symbol', pa.string())])),
+    ('hash', pa.string()),
+    ('id', pa.string()),
+    ('timestamp', pa.string()),
+    ('liquidator', pa.struct([('id', pa.string())])),  # Only present on liquidations
+    ('liquidatee', pa.struct([('id', pa.string())])),  # Only present on liquidations
+])
+
+# Flattened address and symbol columns, stored as dictionaries (pandas categoricals) so that
+# groupby and reindex operate on integer codes instead of hashing 42-character strings
+DICTIONARY_COLUMNS = ['account.id', 'asset.symbol', 'liquidator.id', 'liquidatee.id']
+
+# Prefix of the Parquet files caching the parsed transactions, keyed on the input files
+CACHE_PREFIX = 'cache_'
+
+# Part of every cache key; bump it whenever the loader or feature engineering output changes
+CACHE_VERSION = 2
+
+# Prefix of the Parquet files caching engineered features, keyed on the input files
+FEATURES_CACHE_PREFIX = 'features_'
+
+# Wallet-level feature columns, by the dtype they are stored in after feature engineering
+COUNT_FEATURES = ['transaction_type_count', 'asset.symbol_nunique', 'liquidator_count', 'liquidatee_count']
+AMOUNT_FEATURES = [
+    'amountUSD_sum', 'amountUSD_mean', 'amountUSD_std',
+    'amountUSD_liquidation', 'amountUSD_borrow', 'liquidation_to_borrow_ratio'
+]
+
+
+# Function to convert a string column to numbers, tolerating invalid entries
+def _to_numeric(column, target_type):
+    """
+    Cast a string column to a numeric Arrow type; entries that cannot be parsed become null.
+    """
+    try:
+        return pc.cast(column, target_type)
+    except pa.ArrowInvalid:
+        # Fall back to the lenient pandas parser only when a value fails the strict cast
+        values = pd.to_numeric(column.to_pandas(), errors='coerce')
+        return pa.array(values, from_pandas=True).cast(target_type, safe=False)
+
+
+# Function to parse one transaction array into a flat Arrow table
+def _read_transactions(records, transaction_type):
+    """
+    Build an Arrow table from a list of decoded transaction records and flatten nested fields.
+    """
+    # Fields missing from a record (e.g. liquidator on a deposit) become nulls
+    table = pa.Table.from_pylist(records, schema=TRANSACTION_SCHEMA)
+
+    # Flatten nested structs into dotted columns (account.id, asset.symbol, liquidator.id, ...)
+    table = table.flatten()
+
+    # Convert numeric strings (invalid entries become null) and dictionary-encode repeated strings
+    table = table.set_column(
+        table.schema.get_field_index('amountUSD'), 'amountUSD', _to_numeric(table['amountUSD'], pa.float64())
+    )
+    table = table.set_column(
+        table.schema.get_field_index('timestamp'), 'timestamp', _to_numeric(table['timestamp'], pa.int64())
+    )
+    for column in DICTIONARY_COLUMNS:
+        table = table.set_column(
+            table.schema.get_field_index(column), column, pc.dictionary_encode(table[column])
+        )
+
+    # Add transaction type column
+    transaction_types = pa.DictionaryArray.from_arrays(
+        np.zeros(len(table), dtype=np.int8), pa.array([transaction_type])
+    )
+    return table.append_column('transaction_type', transaction_types)
+
+
+# Function to load one JSON chunk in a worker process
+def _load_one(file):
+    """
+    Parse every transaction type present in one JSON file, returned as an Arrow IPC stream buffer
+    holding one record batch per transaction type (or None if the file holds no known types).
+    """
+    with open(file, 'rb') as f:
+        data = orjson.loads(f.read())
+
+    # Parse each transaction type present in this file
+    tables = [
+        _read_transactions(data[key], transaction_type)
+        for key, transaction_type in TRANSACTION_TYPES
+        if key in data
+    ]
+    if not tables:
+        return None
+
+    # Serialize as an IPC stream so the result crosses the process boundary as one buffer.
+    # The per-type tables share a schema, so they are written as-is without concatenating.
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tables[0].schema) as writer:
+        for table in tables:
+            writer.write_table(table)
+    return sink.getvalue()
+
+
+# Function to parse JSON chunks in parallel
+def _parse_json_files(files):
+    """
+    Parse the JSON files in a process pool, one file per worker, and concatenate the results.
+    """
+    if not files:
+        return None
+
+    with ProcessPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as executor:
+        buffers = list(executor.map(_load_one, files))
+
+    # Stack the record batches of every file and transaction type into one table in a single step
+    batches = [batch for buf in buffers if buf is not None for batch in pa.ipc.open_stream(buf)]
+    return pa.Table.from_batches(batches) if batches else None
+
+
+# Function to locate the cache file for a set of input files
+def _cache_path(prefix, files):
+    """
+    Return the Parquet cache path for the given input files, keyed on a hash of the cache version
+    and the files' sorted paths and modification times.
+    """
+    key = hashlib.sha256(
+        (f'v{CACHE_VERSION}\0' + ''.join(
+            f'{file}\0{os.path.getmtime(file)}\0' for file in sorted(files)
+        )).encode()
+    ).hexdigest()[:16]
+    return Path(f'{prefix}{key}.parquet')
+
+
+# Function to write a cache file so that readers never see a partial file
+def _write_cache(cache, write):
+    """
+    Call write(path) on a temporary file next to the cache file, then move it into place.
+    """
+    tmp = cache.with_name(f'{cache.name}.{os.getpid()}.tmp')
+    try:
+        write(tmp)
+        os.replace(tmp, cache)
+    finally:
+        tmp.unlink(missing_ok=True)
 
 
 # Function to load and normalize nested JSON
@@ -7,38 +176,24 @@ def load_data(files):
     """
     Load raw transaction data from multiple JSON files and dynamically handle transaction types.
     """
-    dfs = []
-    for file in files:
-        with open(file, 'r') as f:
-            data = json.load(f)
-
-            # Check for all possible transaction keys dynamically
-            available_keys = data.keys()  # Get all top-level keys in the JSON
-
-            # Loop through potential transaction types and process those that exist
-            all_dataframes = []
-            for key, transaction_type in [
-                ('deposits', 'deposit'),
-                ('borrows', 'borrow'),
-                ('repayments', 'repay'),
-                ('withdrawals', 'withdraw'),
-                ('liquidations', 'liquidation')
-            ]:
-                if key in available_keys:
-                    df = pd.json_normalize(data, record_path=[key], meta=[
-                        'liquidator.id',  # Flatten nested liquidator field
-                        'liquidatee.id'   # Flatten nested liquidatee field
-                    ], errors='ignore')  # Ignore if meta fields are missing
-                    df['transaction_type'] = transaction_type  # Add transaction type column
-                    all_dataframes.append(df)
-
-            # Combine all transaction data for this file into one DataFrame
-            if all_dataframes:
-                combined_df = pd.concat(all_dataframes, ignore_index=True)
-                dfs.append(combined_df)
-
-    # Concatenate all files into a single DataFrame
-    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+    if not files:
+        return pd.DataFrame()
+
+    # Reuse the Parquet cache written for exactly these files, if none of them changed since
+    cache = _cache_path(CACHE_PREFIX, files)
+    if cache.exists():
+        try:
+            return pq.read_table(cache).to_pandas()
+        except (OSError, pa.ArrowException) as e:
+            print(f"Ignoring unreadable cache {cache}: {e}")  # Rebuilt and overwritten below
+
+    table = _parse_json_files(files)
+    if table is None:
+        return pd.DataFrame()
+    _write_cache(cache, lambda path: pq.write_table(table, path, compression='zstd', use_dictionary=True))
+
+    # Convert to pandas only at the end
+    return table.to_pandas()
 
 
 # Function to preprocess data and extract wallet-level features
@@ -46,95 +201,126 @@ def preprocess_data(data):
     """
     Preprocess raw data to extract wallet-level behavioral features, including liquidation roles.
     """
-    # Ensure amountUSD is numeric
-    data['amountUSD'] = pd.to_numeric(data['amountUSD'], errors='coerce')  # Convert to numeric, invalid entries become NaN
-
-    # Drop rows with NaN in amountUSD
-    data = data.dropna(subset=['amountUSD'])
-
-    # Fix timestamp conversion
-    data['timestamp'] = pd.to_numeric(data['timestamp'], errors='coerce')  # Convert to numeric first
-    data['timestamp'] = pd.to_datetime(data['timestamp'], unit='s', errors='coerce')  # Convert to datetime
-
-    # Group by wallet address and calculate features
-    features = data.groupby('account.id').agg({
-        'amountUSD': ['sum', 'mean', 'std'],  # Transaction statistics
-        'transaction_type': 'count',         # Transaction count
-        'asset.symbol': 'nunique',           # Asset diversity
-    })
-    features.columns = ['_'.join(col) for col in features.columns]  # Flatten column names
-    features.reset_index(inplace=True)
-
-    # Calculate liquidation and borrow sums
-    liquidation_sum = (
-        data[data['transaction_type'] == 'liquidation']
-        .groupby('account.id')['amountUSD'].sum()
-        .rename('amountUSD_liquidation')  # Rename for clarity
-    )
-    borrow_sum = (
-        data[data['transaction_type'] == 'borrow']
-        .groupby('account.id')['amountUSD'].sum()
-        .rename('amountUSD_borrow')  # Rename for clarity
+    is_liquidation = pl.col('transaction_type') == 'liquidation'
+    is_borrow = pl.col('transaction_type') == 'borrow'
+
+    # Only hand the columns the aggregation reads to polars; the wide string columns (hash, id,
+    # liquidator.id, ...) stay behind in the pandas frame
+    transactions = (
+        pl.from_pandas(data[['account.id', 'amountUSD', 'transaction_type', 'asset.symbol']]).lazy()
+        # Drop rows with null in amountUSD (the loader turns unparseable amounts into nulls)
+        .drop_nulls('amountUSD')
+        # Drop rows without a wallet (liquidation records carry no account); pandas' groupby
+        # skipped them, but polars would aggregate them into a null-keyed group
+        .drop_nulls('account.id')
+        # Mask liquidation and borrow amounts once so the groupby sums plain columns
+        .with_columns(
+            (pl.col('amountUSD') * is_liquidation).alias('_amt_liq'),
+            (pl.col('amountUSD') * is_borrow).alias('_amt_bor'),
+        )
     )
 
-    # Merge liquidation and borrow sums into features
-    features = features.merge(liquidation_sum, on='account.id', how='left')
-    features = features.merge(borrow_sum, on='account.id', how='left')
-
-    # Fill missing values with 0
-    features['amountUSD_liquidation'] = features['amountUSD_liquidation'].fillna(0)
-    features['amountUSD_borrow'] = features['amountUSD_borrow'].fillna(0)
+    # Group by wallet address and calculate features in a single query
+    features = transactions.group_by('account.id', maintain_order=True).agg(
+        pl.col('amountUSD').sum().alias('amountUSD_sum'),      # Transaction statistics
+        pl.col('amountUSD').mean().alias('amountUSD_mean'),
+        pl.col('amountUSD').std().alias('amountUSD_std'),
+        pl.len().alias('transaction_type_count'),               # Transaction count
+        pl.col('asset.symbol').drop_nulls().n_unique().alias('asset.symbol_nunique'),  # Asset diversity
+        pl.col('_amt_liq').sum().alias('amountUSD_liquidation'),  # Liquidation sum
+        pl.col('_amt_bor').sum().alias('amountUSD_borrow'),       # Borrow sum
+    )
 
     # Calculate liquidation to borrow ratio
-    features['liquidation_to_borrow_ratio'] = (
-        features['amountUSD_liquidation'] / features['amountUSD_borrow']
-    ).fillna(0)
-
-    # Count liquidator and liquidatee occurrences
-    liquidator_count = (
-        data[data['transaction_type'] == 'liquidation']
-        .groupby('liquidator.id')['amountUSD'].count()
-        .rename('liquidator_count')
+    features = features.with_columns(
+        (pl.col('amountUSD_liquidation') / pl.col('amountUSD_borrow')).fill_nan(0)
+        .alias('liquidation_to_borrow_ratio')
     )
-    liquidatee_count = (
-        data[data['transaction_type'] == 'liquidation']
-        .groupby('liquidatee.id')['amountUSD'].count()
-        .rename('liquidatee_count')
-    )
-
-    # Merge liquidator and liquidatee counts into features
-    features = features.merge(liquidator_count, left_on='account.id', right_index=True, how='left')
-    features = features.merge(liquidatee_count, left_on='account.id', right_index=True, how='left')
 
-    # Fill missing values with 0
-    features['liquidator_count'] = features['liquidator_count'].fillna(0)
-    features['liquidatee_count'] = features['liquidatee_count'].fillna(0)
+    # Convert to pandas only at the end
+    features = features.collect().to_pandas()
+
+    # Count liquidator and liquidatee occurrences with value_counts over the account.id categories,
+    # so each wallet's count is looked up by its category code rather than by address
+    # (astype is a no-op for the categoricals load_data produces and also accepts plain strings)
+    accounts = pd.CategoricalDtype(data['account.id'].astype('category').cat.categories)
+    features['account.id'] = features['account.id'].astype(accounts)
+    codes = features['account.id'].cat.codes.to_numpy()
+    liq_mask = (data['transaction_type'].eq('liquidation') & data['amountUSD'].notna()).to_numpy()
+    for role in ('liquidator', 'liquidatee'):
+        counts = data[f'{role}.id'][liq_mask].astype(accounts).value_counts(sort=False)
+        features[f'{role}_count'] = counts.to_numpy()[codes]
+
+    # Downcast in a single astype to shrink the working set for scoring: counts (never negative)
+    # to uint32, amounts and ratios to float32. The dtypes are fixed rather than sized to the data
+    # so the compiled score kernel always sees the same signature.
+    dtypes = dict.fromkeys(COUNT_FEATURES, np.uint32)
+    dtypes.update(dict.fromkeys(AMOUNT_FEATURES, np.float32))
+    features = features.astype(dtypes)
 
     return features
 
 
-# Function to calculate credit scores
-def calculate_scores(data):
+# Compiled kernel computing the credit score of every wallet in one parallel pass.
+# fastmath omits the no-NaN/no-Inf flags: the liquidation ratio is infinite for
+# wallets that were liquidated without borrowing.
+@numba.njit(parallel=True, fastmath={'contract', 'arcp', 'nsz', 'reassoc'}, cache=True)
+def _score_kernel(total, count, assets, ratio, liquidatee, liquidator, out):
+    for i in numba.prange(total.shape[0]):
+        score = 50.0  # Start with a base score
+
+        # Reward good behavior
+        average = total[i] / count[i] if count[i] > 0 else 0.0
+        score += min(max(average, 0.0), 20.0)  # Normalize
+        score += assets[i] * 2.0  # Asset diversity
+
+        # Penalize risky behavior
+        score -= ratio[i] * 30.0  # Defaults
+        score -= liquidatee[i] * 5.0  # Each liquidation event reduces score
+        score += liquidator[i] * 2.0  # Each liquidation event increases score
+
+        # Ensure scores are within 0-100
+        out[i] = min(max(score, 0.0), 100.0)
+
+
+# Function to load data and extract features, memoized on disk
+def build_features(files):
     """
-    Calculate credit scores for wallets based on behavioral features, including liquidation roles.
+    Load raw data and extract wallet-level features, reusing the features computed by an earlier
+    run when the input files (paths and modification times) and CACHE_VERSION are unchanged.
     """
-    data['score'] = 50  # Start with a base score
-
-    # Reward good behavior
-    data['score'] += (data['amountUSD_sum'] / data['transaction_type_count']).clip(0, 20)  # Normalize
-    data['score'] += data['asset.symbol_nunique'] * 2  # Asset diversity
+    cache = _cache_path(FEATURES_CACHE_PREFIX, files)
+    if cache.exists():
+        try:
+            return pd.read_parquet(cache)
+        except (OSError, pa.ArrowException) as e:
+            print(f"Ignoring unreadable cache {cache}: {e}")  # Rebuilt and overwritten below
 
-    # Penalize risky behavior
-    data['score'] -= data['liquidation_to_borrow_ratio'] * 30  # Defaults
+    raw_data = load_data(files)
+    if raw_data.empty:
+        return pd.DataFrame()
 
-    # Penalize frequent liquidatee behavior
-    data['score'] -= data['liquidatee_count'] * 5  # Each liquidation event reduces score
+    features = preprocess_data(raw_data)
+    _write_cache(cache, lambda path: features.to_parquet(path, compression='zstd'))
+    return features
 
-    # Reward frequent liquidator behavior (optional)
-    data['score'] += data['liquidator_count'] * 2  # Each liquidation event increases score
 
-    # Ensure scores are within 0-100
-    data['score'] = data['score'].clip(0, 100)
+# Function to calculate credit scores
+def calculate_scores(data):
+    """
+    Calculate credit scores for wallets based on behavioral features, including liquidation roles.
+    """
+    scores = np.empty(len(data), dtype=np.float64)
+    _score_kernel(
+        data['amountUSD_sum'].to_numpy(),
+        data['transaction_type_count'].to_numpy(),
+        data['asset.symbol_nunique'].to_numpy(),
+        data['liquidation_to_borrow_ratio'].to_numpy(),
+        data['liquidatee_count'].to_numpy(),
+        data['liquidator_count'].to_numpy(),
+        scores
+    )
+    data['score'] = scores
 
     return data
 
@@ -148,22 +334,18 @@ if __name__ == "__main__":
         r"C:\Users\Manobhiram\Desktop\New proj scoring,py\compoundV2_transactions_ethereum_chunk_2.json"
     ]
 
-    # Step 1: Load and process the raw data
-    raw_data = load_data(files)
-    if raw_data.empty:
+    # Steps 1-2: Load the raw data and extract features (reused from cache if the files are unchanged)
+    try:
+        processed_data = build_features(files)
+    except Exception as e:
+        print(f"Error during feature engineering: {e}")
+        exit()
+
+    if processed_data.empty:
         print("No data was loaded. Please verify the dataset.")
     else:
-        print("Raw data loaded successfully.")
-        print(raw_data.head())
-
-        # Step 2: Preprocess the data to extract features
-        try:
-            processed_data = preprocess_data(raw_data)
-            print("Feature engineering completed.")
-            print(processed_data.head())
-        except Exception as e:
-            print(f"Error during feature engineering: {e}")
-            exit()
+        print("Feature engineering completed.")
+        print(processed_data.head())
 
         # Step 3: Calculate credit scores
         try:
@@ -176,7 +358,7 @@ if __name__ == "__main__":
 
         # Step 4: Save the top 1,000 wallets by score
         try:
-            top_wallets = scored_data.nlargest(1000, 'score')
+            top_wallets = select_extremes(scored_data, 1000)
             top_wallets[['account.id', 'score']].to_csv('top_wallets.csv', index=False)
             print("Top 1,000 wallets saved to 'top_wallets.csv'.")
         except Exception as e:
@@ -0,0 +1,23 @@
+import numpy as np
+
+
+# Select the rows with the k most extreme scores without sorting the whole column
+def select_extremes(data, k, largest=True, score_column='score'):
+    """
+    Return the k rows with the highest (or lowest) scores, ordered by score. Like nlargest/nsmallest
+    with keep='first', rows tied at the cut-off are taken in their original order.
+    """
+    values = data[score_column].to_numpy(dtype=np.float64)
+    missing = np.isnan(values)  # Missing scores are never selected, as with nlargest
+    scores = np.where(missing, -np.inf, values if largest else -values)
+    k = min(k, len(values) - int(missing.sum()))
+    if k <= 0:
+        return data.iloc[:0]
+
+    # Keep everything above the k-th score, then the first rows equal to it
+    threshold = np.partition(scores, -k)[-k]
+    above = np.flatnonzero(scores > threshold)
+    tied = np.flatnonzero(scores == threshold)[:k - len(above)]
+    idx = np.concatenate([above, tied])
+    idx = idx[np.lexsort((idx, -scores[idx]))]  # Ties keep their original row order
+    return data.iloc[idx]